@@ -4,6 +4,9 @@ Simple Database Manager for Smart SQL Pipeline Generator
 import sqlite3
 import pandas as pd
 import os
+import csv
+import tempfile
+import time
 from datetime import datetime
 
 class DatabaseManager:
@@ -11,6 +14,8 @@ class DatabaseManager:
         self.db_path = db_path
         self.ensure_data_directory()
         self.connection = None
+        # Result CSVs live in a per-manager directory that is removed with the manager or at exit
+        self.csv_dir = tempfile.TemporaryDirectory(prefix="sql_results_")
         self.create_sample_database()
     
     def ensure_data_directory(self):
@@ -20,7 +25,8 @@ class DatabaseManager:
     def get_connection(self):
         """Get database connection"""
         if self.connection is None:
-            self.connection = sqlite3.connect(self.db_path)
+            # The manager is shared across Streamlit sessions, whose script threads differ
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
         return self.connection
     
     def create_sample_database(self):
@@ -142,6 +148,81 @@ class DatabaseManager:
                 'data': None
             }
     
+    def execute_query_streaming(self, query: str, preview_rows: int = 500, chunk_size: int = 1000):
+        """Execute SQL query safely without materializing the full result
+        
+        Rows are fetched chunk_size at a time from a forward-only cursor. Only
+        the first preview_rows are kept in memory (as 'data'); every row is
+        streamed to a temporary UTF-8 CSV file whose path is returned as
+        'csv_path'. 'execution_time' covers running the query and fetching its
+        rows; the time spent writing the CSV is reported as 'write_time'.
+        """
+        cursor = None
+        csv_path = None
+        try:
+            # Only allow SELECT queries for safety
+            if not query.strip().upper().startswith('SELECT'):
+                return {
+                    'success': False,
+                    'error': 'Only SELECT queries are allowed',
+                    'data': None
+                }
+            
+            start_time = time.time()
+            cursor = self.get_connection().cursor()
+            cursor.arraysize = chunk_size
+            cursor.execute(query)
+            columns = [col[0] for col in cursor.description]
+            execution_time = time.time() - start_time
+            write_time = 0.0
+            
+            preview = []
+            row_count = 0
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.csv',
+                                             dir=self.csv_dir.name, delete=False) as csv_file:
+                csv_path = csv_file.name
+                writer = csv.writer(csv_file)
+                writer.writerow(columns)
+                while True:
+                    # Only the fetch counts as execution; the optimizer scores execution_time
+                    fetch_start = time.time()
+                    rows = cursor.fetchmany()
+                    execution_time += time.time() - fetch_start
+                    if not rows:
+                        break
+                    write_start = time.time()
+                    writer.writerows(rows)
+                    write_time += time.time() - write_start
+                    if len(preview) < preview_rows:
+                        preview.extend(rows[:preview_rows - len(preview)])
+                    row_count += len(rows)
+            
+            return {
+                'success': True,
+                'data': pd.DataFrame(preview, columns=columns),
+                'row_count': row_count,
+                'columns': columns,
+                'execution_time': execution_time,
+                'write_time': write_time,
+                'csv_path': csv_path
+            }
+            
+        except Exception as e:
+            # Don't leave a partially written CSV behind
+            if csv_path:
+                try:
+                    os.remove(csv_path)
+                except OSError:
+                    pass
+            return {
+                'success': False,
+                'error': str(e),
+                'data': None
+            }
+        finally:
+            if cursor is not None:
+                cursor.close()
+    
     def get_schema_info(self):
         """Get database schema information"""
         try:
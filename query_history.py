@@ -0,0 +1,63 @@
+"""
+Query History Store
+Persists each session's executed queries to a local SQLite file so history survives reruns
+"""
+import sqlite3
+import threading
+import pandas as pd
+import os
+
+class QueryHistory:
+    def __init__(self, db_path: str = "../data/history.sqlite", max_rows: int = 10000):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # One connection shared by every Streamlit session; writes are serialized by the lock
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.create_table()
+    
+    def create_table(self):
+        """Create the history table if it doesn't exist"""
+        with self.lock:
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                ts TEXT,
+                requirement TEXT,
+                sql TEXT,
+                success INTEGER,
+                row_count INTEGER,
+                exec_time REAL,
+                session_id TEXT
+            )
+            """)
+            # History files written before rows were tagged lack the session column
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(queries)")]
+            if 'session_id' not in columns:
+                self.connection.execute("ALTER TABLE queries ADD COLUMN session_id TEXT")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_queries_session ON queries (session_id)")
+            self.connection.commit()
+    
+    def record(self, session_id: str, ts: str, requirement: str, sql: str, success: bool, row_count: int, exec_time: float):
+        """Store one executed query for a session, dropping the oldest rows beyond max_rows"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO queries (ts, requirement, sql, success, row_count, exec_time, session_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ts, requirement, sql, int(success), row_count, exec_time, session_id)
+            )
+            self.connection.execute("DELETE FROM queries WHERE rowid <= ?", (cursor.lastrowid - self.max_rows,))
+            self.connection.commit()
+    
+    def recent(self, session_id: str, limit: int = 200) -> pd.DataFrame:
+        """A session's most recent executions, oldest first, with the columns the analytics tab charts"""
+        with self.lock:
+            df = pd.read_sql_query(
+                """
+                SELECT ts AS timestamp, requirement, success, row_count, exec_time AS execution_time
+                FROM queries WHERE session_id = ? ORDER BY rowid DESC LIMIT ?
+                """,
+                self.connection,
+                params=(session_id, limit)
+            )
+        df['success'] = df['success'].astype(bool)
+        return df.iloc[::-1].reset_index(drop=True)
@@ -0,0 +1,15 @@
+"""
+Shared SQL Parse Cache
+Parses each distinct SQL string once per process so every module reuses one parse tree
+"""
+from functools import lru_cache
+import sqlparse
+from sqlparse.sql import Statement
+
+@lru_cache(maxsize=2048)
+def parse(sql: str) -> Statement:
+    """Parse the first statement of a SQL string, cached by its exact text.
+
+    The returned Statement is shared by all callers, so treat it as read-only.
+    """
+    return sqlparse.parse(sql)[0]
@@ -2,14 +2,102 @@
 Advanced SQL Optimizer and Analysis Engine
 Provides performance analysis, optimization suggestions, and cost estimation
 """
-import sqlparse
+from sqlparse.sql import Statement
+from sqlparse.tokens import Comment, Keyword, Name, Punctuation, String, Whitespace, Wildcard
 import re
+import sys
 import time
+from collections import Counter
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from enum import Enum
 import sqlite3
-import pandas as pd
+import statistics
+import sql_cache
+
+# Keywords whose casing _calculate_readability_score compares
+_CASING_KEYWORDS = re.compile(r'\b(SELECT|FROM|WHERE|JOIN|GROUP BY|ORDER BY)\b', re.IGNORECASE)
+
+# Function calls tallied by _scan_keywords; sqlparse lexes these as names, not keywords
+_FUNCTION_KEYWORDS = frozenset(['SUM', 'COUNT', 'AVG', 'MAX', 'MIN', 'CAST'])
+
+def _token_arrays(parsed: Statement) -> Tuple[Tuple, Tuple[str, ...]]:
+    """Flatten a parsed statement into parallel (ttypes, values) tuples.
+
+    Whitespace tokens are dropped. Keyword values are normalized to
+    single-spaced uppercase and interned, so repeated keywords share one
+    string object and compare by identity.
+    """
+    ttypes = []
+    values = []
+    for token in parsed.flatten():
+        ttype = token.ttype
+        if ttype in Whitespace:
+            continue
+        ttypes.append(ttype)
+        if ttype in Keyword:
+            values.append(sys.intern(' '.join(token.value.upper().split())))
+        else:
+            values.append(token.value)
+    return tuple(ttypes), tuple(values)
+
+def _scan_keywords(ttypes: Tuple, values: Tuple[str, ...]) -> Counter[str]:
+    """Count keywords and constructs of interest in one pass over the token arrays.
+
+    Keywords are counted by their normalized value ('LEFT JOIN' also counts as
+    'JOIN', 'UNION ALL' as 'UNION'), so text inside string literals and comments
+    never produces false hits. A few token pairs are tallied under their own
+    keys: 'SELECT *' and calls to the functions in _FUNCTION_KEYWORDS. The
+    AS inside CAST(x AS type) is not an alias and is not counted. Comments, string literals and opening parentheses are counted as
+    'COMMENT', 'STRING' and '('. This is the hot path of analyze_query; it is
+    fully annotated so the module can be compiled to a native extension with
+    `mypyc sql_optimizer.py`, which Python then loads in place of this file.
+    """
+    counts: Counter[str] = Counter()
+    previous = ''
+    previous_ttype = None
+    depth = 0
+    cast_depths: List[int] = []  # parenthesis depth of each open CAST( call
+    
+    for ttype, value in zip(ttypes, values):
+        if ttype in Keyword:
+            if value != 'AS' or not cast_depths or cast_depths[-1] != depth:
+                counts[value] += 1
+            if value.endswith(' JOIN'):
+                counts['JOIN'] += 1
+            elif value.startswith('UNION '):
+                counts['UNION'] += 1
+        elif ttype in Comment:
+            counts['COMMENT'] += 1
+        elif ttype in String.Single:
+            counts['STRING'] += 1
+        elif ttype is Wildcard and previous == 'SELECT':
+            counts['SELECT *'] += 1
+        elif ttype is Punctuation and value == '(':
+            counts['('] += 1
+            depth += 1
+            if previous_ttype in Name:
+                function = previous.upper()
+                if function in _FUNCTION_KEYWORDS:
+                    counts[function] += 1
+                    if function == 'CAST':
+                        cast_depths.append(depth)
+        elif ttype is Punctuation and value == ')':
+            if cast_depths and cast_depths[-1] == depth:
+                cast_depths.pop()
+            depth -= 1
+        
+        previous = value
+        previous_ttype = ttype
+    
+    return counts
+
+def _scan_query(sql_query: str) -> Tuple[Tuple, Tuple[str, ...], Counter[str]]:
+    """Parse a query (via the shared parse cache) and return its token arrays and keyword counts"""
+    parsed = sql_cache.parse(sql_query)
+    ttypes, values = _token_arrays(parsed)
+    return ttypes, values, _scan_keywords(ttypes, values)
 
 class QueryComplexity(Enum):
     SIMPLE = "Simple"
@@ -23,7 +111,7 @@ class OptimizationLevel(Enum):
     HIGH = "High Priority"
     CRITICAL = "Critical"
 
-@dataclass
+@dataclass(frozen=True)
 class OptimizationSuggestion:
     category: str
     suggestion: str
@@ -31,80 +119,255 @@ class OptimizationSuggestion:
     explanation: str
     example: Optional[str] = None
 
-@dataclass
+# Suggestions that never vary between queries; being frozen, one instance is shared by every analysis
+_SELECT_STAR_SUGGESTION = OptimizationSuggestion(
+    category="Column Selection",
+    suggestion="Avoid SELECT * - specify only needed columns",
+    impact=OptimizationLevel.MEDIUM,
+    explanation="SELECT * retrieves all columns, which increases I/O and network overhead",
+    example="SELECT id, name, email FROM users -- instead of SELECT * FROM users"
+)
+
+_MISSING_WHERE_SUGGESTION = OptimizationSuggestion(
+    category="Filtering",
+    suggestion="Consider adding WHERE clause to limit results",
+    impact=OptimizationLevel.HIGH,
+    explanation="Unfiltered queries can return large datasets and impact performance",
+    example="SELECT * FROM orders WHERE order_date >= '2024-01-01'"
+)
+
+_JOIN_FILTER_SUGGESTION = OptimizationSuggestion(
+    category="JOIN Optimization",
+    suggestion="Add WHERE conditions to reduce JOIN result set",
+    impact=OptimizationLevel.HIGH,
+    explanation="Filtering before JOINs reduces the amount of data being joined",
+    example="Add WHERE conditions on the most selective columns first"
+)
+
+_ORDER_WITHOUT_LIMIT_SUGGESTION = OptimizationSuggestion(
+    category="Result Limiting",
+    suggestion="Consider adding LIMIT clause with ORDER BY",
+    impact=OptimizationLevel.MEDIUM,
+    explanation="ORDER BY without LIMIT sorts entire result set unnecessarily",
+    example="ORDER BY column_name LIMIT 100"
+)
+
+_INDEX_SUGGESTION = OptimizationSuggestion(
+    category="Indexing",
+    suggestion="Ensure indexes exist on WHERE clause columns",
+    impact=OptimizationLevel.HIGH,
+    explanation="Proper indexes dramatically improve WHERE clause performance",
+    example="CREATE INDEX idx_column_name ON table_name(column_name)"
+)
+
+_IN_SUBQUERY_SUGGESTION = OptimizationSuggestion(
+    category="Query Structure",
+    suggestion="Consider converting IN subqueries to JOINs",
+    impact=OptimizationLevel.MEDIUM,
+    explanation="JOINs are often more efficient than correlated subqueries",
+    example="Use INNER JOIN instead of WHERE column IN (SELECT ...)"
+)
+
+_DATA_TYPE_SUGGESTION = OptimizationSuggestion(
+    category="Data Types",
+    suggestion="Ensure proper data type handling in comparisons",
+    impact=OptimizationLevel.LOW,
+    explanation="Implicit type conversions can prevent index usage",
+    example="Use proper data types: WHERE date_column = DATE('2024-01-01')"
+)
+
 class QueryAnalysis:
-    complexity: QueryComplexity
-    estimated_cost: float
-    execution_time: float
-    row_count: int
-    suggestions: List[OptimizationSuggestion]
-    performance_score: int  # 0-100
-    readability_score: int  # 0-100
+    """Analysis of a single query whose metrics are computed on first access.
+
+    Construction only keeps the query, its execution time and row count, and
+    the shared token arrays and keyword counts; reading e.g. performance_score
+    runs just that computation. Call materialize() to compute everything
+    eagerly.
+    Analyses compare equal when built from the same query and execution
+    metrics, which makes them usable as cache keys.
+    """
+    
+    _LAZY_FIELDS = ('complexity', 'estimated_cost', 'suggestions', 'performance_score', 'readability_score')
+    _STATIC_FIELDS = ('complexity', 'estimated_cost', 'readability_score')
+    
+    def __init__(self, optimizer: 'SQLOptimizer', sql_query: str, execution_result: Optional[Dict],
+                 ttypes: Tuple, values: Tuple[str, ...], counts: Counter[str]):
+        self._optimizer = optimizer
+        self.sql_query = sql_query
+        self.ttypes = ttypes
+        self.values = values
+        self.counts = counts
+        
+        # Only the execution metrics are kept; the result itself may hold a large preview DataFrame
+        self.execution_time = execution_result.get('execution_time', 0) if execution_result else 0
+        self.row_count = execution_result.get('row_count', 0) if execution_result else 0
+    
+    @cached_property
+    def complexity(self) -> QueryComplexity:
+        return self._optimizer._assess_complexity(self.counts)
+    
+    @cached_property
+    def estimated_cost(self) -> float:
+        return self._optimizer._estimate_cost(self.counts)
+    
+    @cached_property
+    def suggestions(self) -> Tuple[OptimizationSuggestion, ...]:
+        return tuple(self._optimizer._generate_suggestions(self.counts, self.execution_time))
+    
+    @cached_property
+    def performance_score(self) -> int:  # 0-100
+        return self._optimizer._calculate_performance_score(self.counts, self.execution_time, self.row_count)
+    
+    @cached_property
+    def readability_score(self) -> int:  # 0-100
+        return self._optimizer._calculate_readability_score(self.sql_query, self.counts)
+    
+    def materialize(self) -> 'QueryAnalysis':
+        """Compute every metric now and return the analysis"""
+        for field in self._LAZY_FIELDS:
+            getattr(self, field)
+        return self
+    
+    def with_execution_result(self, execution_result: Optional[Dict]) -> 'QueryAnalysis':
+        """Return an analysis of the same query bound to an execution result.
+        
+        The parse is shared and any static metric already computed (those that
+        don't depend on execution) is carried over instead of recomputed.
+        """
+        analysis = QueryAnalysis(self._optimizer, self.sql_query, execution_result,
+                                 self.ttypes, self.values, self.counts)
+        # Compiled builds have no instance __dict__ and recompute on access anyway
+        computed = getattr(self, '__dict__', {})
+        for field in self._STATIC_FIELDS:
+            if field in computed:
+                setattr(analysis, field, computed[field])
+        return analysis
+    
+    def _key(self) -> Tuple:
+        return (self.sql_query, self.execution_time, self.row_count)
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, QueryAnalysis):
+            return NotImplemented
+        return self._key() == other._key()
+    
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+@lru_cache(maxsize=256)
+def _render_optimization_report(query_analysis: QueryAnalysis) -> str:
+    """Render the markdown optimization report; memoized since rendering is pure"""
+    
+    report = f"""
+# 📊 SQL Query Analysis Report
+
+## 🎯 Overall Assessment
+- **Complexity**: {query_analysis.complexity.value}
+- **Estimated Cost**: {query_analysis.estimated_cost}/10
+- **Performance Score**: {query_analysis.performance_score}/100
+- **Readability Score**: {query_analysis.readability_score}/100
+
+## ⚡ Execution Metrics
+- **Execution Time**: {query_analysis.execution_time:.3f} seconds
+- **Rows Returned**: {query_analysis.row_count:,}
+
+## 🔧 Optimization Suggestions
+
+"""
+    
+    if not query_analysis.suggestions:
+        report += "✅ **No major optimization issues found!** Your query follows good practices.\n"
+    else:
+        for i, suggestion in enumerate(query_analysis.suggestions, 1):
+            impact_emoji = {
+                OptimizationLevel.LOW: "🟡",
+                OptimizationLevel.MEDIUM: "🟠", 
+                OptimizationLevel.HIGH: "🔴",
+                OptimizationLevel.CRITICAL: "🚨"
+            }.get(suggestion.impact, "⚪")
+            
+            report += f"""
+### {i}. {suggestion.category} {impact_emoji}
+**Issue**: {suggestion.suggestion}
+**Impact**: {suggestion.impact.value}
+**Explanation**: {suggestion.explanation}
+"""
+            if suggestion.example:
+                report += f"**Example**: `{suggestion.example}`\n"
+    
+    return report
 
 class SQLOptimizer:
     def __init__(self, database_manager=None):
         self.db_manager = database_manager
         
-    def analyze_query(self, sql_query: str, execution_result: Dict = None) -> QueryAnalysis:
-        """Comprehensive SQL query analysis"""
-        
-        # Parse the SQL
-        parsed = sqlparse.parse(sql_query)[0]
-        tokens = list(parsed.flatten())
-        
-        # Basic metrics
-        complexity = self._assess_complexity(sql_query, tokens)
-        estimated_cost = self._estimate_cost(sql_query, tokens)
+    def analyze_query(self, sql_query: str, execution_result: Optional[Dict] = None) -> QueryAnalysis:
+        """Comprehensive SQL query analysis; metrics are computed when first read"""
         
-        # Get execution metrics if available
-        execution_time = execution_result.get('execution_time', 0) if execution_result else 0
-        row_count = execution_result.get('row_count', 0) if execution_result else 0
+        # Parse the SQL once and share the keyword counts across all metrics
+        ttypes, values, counts = _scan_query(sql_query)
         
-        # Generate optimization suggestions
-        suggestions = self._generate_suggestions(sql_query, tokens, execution_result)
+        return QueryAnalysis(self, sql_query, execution_result, ttypes, values, counts)
+    
+    def analyze_query_static(self, sql_query: str) -> QueryAnalysis:
+        """Compute the metrics that don't need an execution result.
         
-        # Calculate scores
-        performance_score = self._calculate_performance_score(sql_query, execution_time, row_count)
-        readability_score = self._calculate_readability_score(sql_query, tokens)
+        Safe to run while the query itself executes; bind the result afterwards
+        with QueryAnalysis.with_execution_result().
+        """
         
-        return QueryAnalysis(
-            complexity=complexity,
-            estimated_cost=estimated_cost,
-            execution_time=execution_time,
-            row_count=row_count,
-            suggestions=suggestions,
-            performance_score=performance_score,
-            readability_score=readability_score
-        )
+        analysis = self.analyze_query(sql_query)
+        for field in analysis._STATIC_FIELDS:
+            getattr(analysis, field)
+        return analysis
+    
+    def analyze_queries(self, sql_queries: List[str], execution_results: Optional[List[Optional[Dict]]] = None) -> List[QueryAnalysis]:
+        """Analyze a batch of queries, parsing and scanning each distinct query only once"""
+        
+        if execution_results is None:
+            execution_results = [None] * len(sql_queries)
+        elif len(execution_results) != len(sql_queries):
+            raise ValueError(
+                f"Got {len(execution_results)} execution results for {len(sql_queries)} queries"
+            )
+        
+        # Scan all distinct queries up front, then build the analyses in one tight loop
+        scans = {}
+        for sql_query in sql_queries:
+            if sql_query not in scans:
+                scans[sql_query] = _scan_query(sql_query)
+        
+        return [
+            QueryAnalysis(self, sql_query, execution_result, *scans[sql_query])
+            for sql_query, execution_result in zip(sql_queries, execution_results)
+        ]
     
-    def _assess_complexity(self, sql_query: str, tokens: List) -> QueryComplexity:
+    def _assess_complexity(self, counts: Counter[str]) -> QueryComplexity:
         """Assess query complexity based on various factors"""
         
         complexity_score = 0
-        sql_upper = sql_query.upper()
         
         # Check for complex operations
-        if 'JOIN' in sql_upper:
-            join_count = sql_upper.count('JOIN')
-            complexity_score += join_count * 2
+        if counts['JOIN']:
+            complexity_score += counts['JOIN'] * 2
         
-        if 'SUBQUERY' in sql_upper or '(' in sql_query:
-            subquery_count = sql_query.count('SELECT') - 1
+        if counts['(']:
+            subquery_count = counts['SELECT'] - 1
             complexity_score += subquery_count * 3
         
-        if 'UNION' in sql_upper:
+        if counts['UNION']:
             complexity_score += 3
         
-        if 'WINDOW' in sql_upper or 'OVER' in sql_upper:
+        if counts['WINDOW'] or counts['OVER']:
             complexity_score += 4
         
-        if 'WITH' in sql_upper:  # CTE
+        if counts['WITH']:  # CTE
             complexity_score += 2
         
         # Check for aggregations
         agg_functions = ['SUM', 'COUNT', 'AVG', 'MAX', 'MIN', 'GROUP BY']
         for func in agg_functions:
-            if func in sql_upper:
+            if counts[func]:
                 complexity_score += 1
         
         # Determine complexity level
@@ -117,238 +380,145 @@ class SQLOptimizer:
         else:
             return QueryComplexity.VERY_COMPLEX
     
-    def _estimate_cost(self, sql_query: str, tokens: List) -> float:
+    def _estimate_cost(self, counts: Counter[str]) -> float:
         """Estimate query execution cost (simplified model)"""
         
         base_cost = 1.0
-        sql_upper = sql_query.upper()
         
         # Table scan costs
-        table_count = sql_upper.count('FROM') + sql_upper.count('JOIN')
+        table_count = counts['FROM'] + counts['JOIN']
         base_cost += table_count * 0.5
         
         # Join costs (exponential)
-        join_count = sql_upper.count('JOIN')
+        join_count = counts['JOIN']
         if join_count > 0:
             base_cost += (2 ** join_count) * 0.3
         
         # Subquery costs
-        subquery_count = sql_query.count('SELECT') - 1
+        subquery_count = counts['SELECT'] - 1
         base_cost += subquery_count * 2.0
         
         # Aggregation costs
-        if 'GROUP BY' in sql_upper:
+        if counts['GROUP BY']:
             base_cost += 1.5
         
         # Sorting costs
-        if 'ORDER BY' in sql_upper:
+        if counts['ORDER BY']:
             base_cost += 1.0
         
         # Window function costs
-        if 'OVER' in sql_upper:
+        if counts['OVER']:
             base_cost += 2.0
         
         return round(base_cost, 2)
     
-    def _generate_suggestions(self, sql_query: str, tokens: List, execution_result: Dict = None) -> List[OptimizationSuggestion]:
+    def _generate_suggestions(self, counts: Counter[str], execution_time: float = 0) -> List[OptimizationSuggestion]:
         """Generate optimization suggestions based on query analysis"""
         
         suggestions = []
-        sql_upper = sql_query.upper()
         
         # Check for SELECT *
-        if 'SELECT *' in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Column Selection",
-                suggestion="Avoid SELECT * - specify only needed columns",
-                impact=OptimizationLevel.MEDIUM,
-                explanation="SELECT * retrieves all columns, which increases I/O and network overhead",
-                example="SELECT id, name, email FROM users -- instead of SELECT * FROM users"
-            ))
+        if counts['SELECT *']:
+            suggestions.append(_SELECT_STAR_SUGGESTION)
         
         # Check for missing WHERE clause
-        if 'WHERE' not in sql_upper and 'SELECT' in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Filtering",
-                suggestion="Consider adding WHERE clause to limit results",
-                impact=OptimizationLevel.HIGH,
-                explanation="Unfiltered queries can return large datasets and impact performance",
-                example="SELECT * FROM orders WHERE order_date >= '2024-01-01'"
-            ))
+        if not counts['WHERE'] and counts['SELECT']:
+            suggestions.append(_MISSING_WHERE_SUGGESTION)
         
         # Check for inefficient JOINs
-        if 'JOIN' in sql_upper and 'WHERE' not in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="JOIN Optimization",
-                suggestion="Add WHERE conditions to reduce JOIN result set",
-                impact=OptimizationLevel.HIGH,
-                explanation="Filtering before JOINs reduces the amount of data being joined",
-                example="Add WHERE conditions on the most selective columns first"
-            ))
+        if counts['JOIN'] and not counts['WHERE']:
+            suggestions.append(_JOIN_FILTER_SUGGESTION)
         
         # Check for ORDER BY without LIMIT
-        if 'ORDER BY' in sql_upper and 'LIMIT' not in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Result Limiting",
-                suggestion="Consider adding LIMIT clause with ORDER BY",
-                impact=OptimizationLevel.MEDIUM,
-                explanation="ORDER BY without LIMIT sorts entire result set unnecessarily",
-                example="ORDER BY column_name LIMIT 100"
-            ))
+        if counts['ORDER BY'] and not counts['LIMIT']:
+            suggestions.append(_ORDER_WITHOUT_LIMIT_SUGGESTION)
         
         # Check for potential index usage
-        if 'WHERE' in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Indexing",
-                suggestion="Ensure indexes exist on WHERE clause columns",
-                impact=OptimizationLevel.HIGH,
-                explanation="Proper indexes dramatically improve WHERE clause performance",
-                example="CREATE INDEX idx_column_name ON table_name(column_name)"
-            ))
+        if counts['WHERE']:
+            suggestions.append(_INDEX_SUGGESTION)
         
         # Check for subqueries that could be JOINs
-        if sql_query.count('SELECT') > 1 and 'IN (' in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Query Structure",
-                suggestion="Consider converting IN subqueries to JOINs",
-                impact=OptimizationLevel.MEDIUM,
-                explanation="JOINs are often more efficient than correlated subqueries",
-                example="Use INNER JOIN instead of WHERE column IN (SELECT ...)"
-            ))
+        if counts['SELECT'] > 1 and counts['IN']:
+            suggestions.append(_IN_SUBQUERY_SUGGESTION)
         
         # Performance-based suggestions
-        if execution_result and execution_result.get('execution_time', 0) > 1.0:
+        if execution_time > 1.0:
             suggestions.append(OptimizationSuggestion(
                 category="Performance",
                 suggestion="Query execution time is high - consider optimization",
                 impact=OptimizationLevel.CRITICAL,
-                explanation=f"Execution time: {execution_result['execution_time']:.3f}s is above recommended threshold",
+                explanation=f"Execution time: {execution_time:.3f}s is above recommended threshold",
                 example="Review indexes, query structure, and data volumes"
             ))
         
         # Check for potential data type issues
-        if "'" in sql_query and 'CAST' not in sql_upper:
-            suggestions.append(OptimizationSuggestion(
-                category="Data Types",
-                suggestion="Ensure proper data type handling in comparisons",
-                impact=OptimizationLevel.LOW,
-                explanation="Implicit type conversions can prevent index usage",
-                example="Use proper data types: WHERE date_column = DATE('2024-01-01')"
-            ))
+        if counts['STRING'] and not counts['CAST']:
+            suggestions.append(_DATA_TYPE_SUGGESTION)
         
         return suggestions
     
-    def _calculate_performance_score(self, sql_query: str, execution_time: float, row_count: int) -> int:
+    def _calculate_performance_score(self, counts: Counter[str], execution_time: float, row_count: int) -> int:
         """Calculate performance score (0-100, higher is better)"""
         
-        score = 100
-        sql_upper = sql_query.upper()
-        
-        # Deduct points for performance issues
-        if 'SELECT *' in sql_upper:
-            score -= 15
-        
-        if 'WHERE' not in sql_upper:
-            score -= 25
-        
-        if execution_time > 1.0:
-            score -= min(30, int(execution_time * 10))
-        
-        if 'ORDER BY' in sql_upper and 'LIMIT' not in sql_upper:
-            score -= 10
-        
-        # Deduct for complexity without optimization
-        join_count = sql_upper.count('JOIN')
-        if join_count > 2:
-            score -= (join_count - 2) * 5
-        
-        # Bonus for good practices
-        if 'LIMIT' in sql_upper:
-            score += 5
-        
-        if 'WITH' in sql_upper:  # Using CTEs
-            score += 5
+        has_limit = counts['LIMIT'] > 0
+        
+        # Booleans act as 0/1 multipliers, so the score is one arithmetic expression
+        score = (
+            100
+            # Deduct points for performance issues
+            - 15 * (counts['SELECT *'] > 0)
+            - 25 * (counts['WHERE'] == 0)
+            - min(30, int(execution_time * 10)) * (execution_time > 1.0)
+            - 10 * (counts['ORDER BY'] > 0 and not has_limit)
+            # Deduct for complexity without optimization
+            - 5 * max(0, counts['JOIN'] - 2)
+            # Bonus for good practices
+            + 5 * has_limit
+            + 5 * (counts['WITH'] > 0)  # Using CTEs
+        )
         
         return max(0, min(100, score))
     
-    def _calculate_readability_score(self, sql_query: str, tokens: List) -> int:
+    def _calculate_readability_score(self, sql_query: str, counts: Counter[str]) -> int:
         """Calculate readability score (0-100, higher is better)"""
         
         score = 100
-        lines = sql_query.strip().split('\n')
+        lines = sql_query.strip().splitlines()
         
         # Check formatting
         if len(lines) == 1 and len(sql_query) > 100:
             score -= 20  # Single long line
         
         # Check for proper indentation
-        has_indentation = any(line.startswith('    ') or line.startswith('\t') for line in lines)
+        has_indentation = any(line.startswith(('    ', '\t')) for line in lines)
         if not has_indentation and len(lines) > 3:
             score -= 15
         
         # Check for comments
-        if '--' in sql_query or '/*' in sql_query:
+        if counts['COMMENT']:
             score += 10
         
-        # Check for consistent keyword casing
-        keywords = ['SELECT', 'FROM', 'WHERE', 'JOIN', 'GROUP BY', 'ORDER BY']
-        keyword_cases = []
-        for keyword in keywords:
-            if keyword in sql_query:
-                keyword_cases.append(keyword.isupper())
-            elif keyword.lower() in sql_query:
-                keyword_cases.append(False)
+        # Check for consistent keyword casing (an uppercase spelling wins per keyword)
+        keyword_cases = {}
+        for match in _CASING_KEYWORDS.finditer(sql_query):
+            keyword = match.group()
+            if keyword.isupper():
+                keyword_cases[keyword] = True
+            elif keyword.islower():
+                keyword_cases.setdefault(keyword.upper(), False)
         
-        if keyword_cases and not all(keyword_cases) and not all(not case for case in keyword_cases):
+        if len(set(keyword_cases.values())) > 1:
             score -= 10  # Inconsistent casing
         
         # Check for meaningful aliases
-        if ' AS ' in sql_query.upper():
+        if counts['AS']:
             score += 5
         
         return max(0, min(100, score))
     
     def get_optimization_report(self, query_analysis: QueryAnalysis) -> str:
         """Generate a comprehensive optimization report"""
-        
-        report = f"""
-# 📊 SQL Query Analysis Report
-
-## 🎯 Overall Assessment
-- **Complexity**: {query_analysis.complexity.value}
-- **Estimated Cost**: {query_analysis.estimated_cost}/10
-- **Performance Score**: {query_analysis.performance_score}/100
-- **Readability Score**: {query_analysis.readability_score}/100
-
-## ⚡ Execution Metrics
-- **Execution Time**: {query_analysis.execution_time:.3f} seconds
-- **Rows Returned**: {query_analysis.row_count:,}
-
-## 🔧 Optimization Suggestions
-
-"""
-        
-        if not query_analysis.suggestions:
-            report += "✅ **No major optimization issues found!** Your query follows good practices.\n"
-        else:
-            for i, suggestion in enumerate(query_analysis.suggestions, 1):
-                impact_emoji = {
-                    OptimizationLevel.LOW: "🟡",
-                    OptimizationLevel.MEDIUM: "🟠", 
-                    OptimizationLevel.HIGH: "🔴",
-                    OptimizationLevel.CRITICAL: "🚨"
-                }.get(suggestion.impact, "⚪")
-                
-                report += f"""
-### {i}. {suggestion.category} {impact_emoji}
-**Issue**: {suggestion.suggestion}
-**Impact**: {suggestion.impact.value}
-**Explanation**: {suggestion.explanation}
-"""
-                if suggestion.example:
-                    report += f"**Example**: `{suggestion.example}`\n"
-        
-        return report
+        return _render_optimization_report(query_analysis)
     
     def benchmark_query(self, sql_query: str, iterations: int = 5) -> Dict:
         """Benchmark query performance over multiple executions"""
@@ -376,7 +546,8 @@ class SQLOptimizer:
             "avg_execution_time": sum(execution_times) / len(execution_times),
             "min_execution_time": min(execution_times),
             "max_execution_time": max(execution_times),
-            "std_deviation": pd.Series(execution_times).std(),
+            # Sample standard deviation (ddof=1), matching the previous pandas result
+            "std_deviation": statistics.stdev(execution_times) if len(execution_times) > 1 else float('nan'),
             "all_times": execution_times,
             "row_count": results[0]['row_count'] if results else 0
         }
@@ -415,5 +586,53 @@ def test_optimizer():
     
     return analysis
 
+def test_analysis_paths():
+    """Check that the batch and static analysis paths match analyze_query"""
+    print("🧪 Testing analysis paths...")
+    
+    optimizer = SQLOptimizer()
+    
+    queries = [
+        "SELECT * FROM customers ORDER BY name",
+        "SELECT c.name, COUNT(*) AS orders FROM customers c JOIN orders o ON c.customer_id = o.customer_id WHERE o.status = 'shipped' GROUP BY c.name",
+        "SELECT * FROM customers ORDER BY name",
+    ]
+    results = [
+        {'success': True, 'execution_time': 0.05, 'row_count': 10},
+        {'success': True, 'execution_time': 1.5, 'row_count': 3},
+        None,
+    ]
+    
+    def metrics(analysis: QueryAnalysis) -> Tuple:
+        return (analysis.complexity, analysis.estimated_cost, analysis.suggestions,
+                analysis.performance_score, analysis.readability_score,
+                analysis.execution_time, analysis.row_count)
+    
+    # The shared parse cache returns the same statement for a repeated query
+    assert sql_cache.parse(queries[0]) is sql_cache.parse(queries[0])
+    
+    # Batch analysis matches analyzing each query on its own
+    batch = optimizer.analyze_queries(queries, results)
+    for sql_query, execution_result, analysis in zip(queries, results, batch):
+        assert metrics(analysis.materialize()) == metrics(optimizer.analyze_query(sql_query, execution_result))
+    assert batch[0].counts is batch[2].counts  # repeated query is scanned once
+    
+    try:
+        optimizer.analyze_queries(queries, results[:2])
+        raise AssertionError("mismatched batch lengths were accepted")
+    except ValueError:
+        pass
+    
+    # Static analysis bound to a result afterwards matches a full analysis
+    for sql_query, execution_result in zip(queries, results):
+        bound = optimizer.analyze_query_static(sql_query).with_execution_result(execution_result)
+        full = optimizer.analyze_query(sql_query, execution_result)
+        assert metrics(bound) == metrics(full)
+        assert bound == full
+        assert optimizer.get_optimization_report(bound) == optimizer.get_optimization_report(full)
+    
+    print("✅ Batch and static analyses match analyze_query")
+
 if __name__ == "__main__":
-    test_optimizer()
\ No newline at end of file
+    test_optimizer()
+    test_analysis_paths()
\ No newline at end of file
@@ -6,16 +6,20 @@ import sys
 import os
 import pandas as pd
 import json
+import re
+import uuid
 from datetime import datetime
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # Add src directory to path
 sys.path.append(os.path.dirname(__file__))
 
 from sql_agent import SQLPipelineAgent
 from database_manager import DatabaseManager
+from query_history import QueryHistory
 import time
-import plotly.express as px
-import plotly.graph_objects as go
 
 # Try to import Day 3 components (optional)
 try:
@@ -30,6 +34,61 @@ try:
 except ImportError:
     EXPORT_AVAILABLE = False
 
+# Static markdown, built once per process rather than on every rerun
+DAY3_PROGRESS_MD = """
+**Day 3 Progress:**
+- 🔍 SQL Optimization Engine ✅
+- 📁 Multi-Format Export ✅  
+- 📊 Advanced Analytics ✅
+- 🎨 Enhanced UI ✅
+"""
+
+WHAT_YOU_GET_MD = """
+- **🔍 Performance Analysis** with 0-100 scoring
+- **⚡ Optimization Suggestions** with specific recommendations
+- **📊 Advanced Export Options** (CSV, JSON, Excel, SQL, TXT)
+- **🎨 Enhanced UI** with professional styling
+- **📈 Comprehensive Analytics** with trend analysis
+"""
+
+# Analytics empty state: notice, heading and feature list as one markdown element
+_EMPTY_ANALYTICS_MD = "\n\n".join([
+    "ℹ️ No analytics data available yet. Execute some queries to see comprehensive analytics!",
+    "### 📊 Available Analytics Features",
+    "📈 **Performance Trends**: Track query execution times and success rates",
+    "🎯 **Optimization Insights**: Monitor performance improvements over time", 
+    "🔍 **Complexity Analysis**: Analyze query complexity distribution",
+    "⚡ **Success Rate Monitoring**: Track and improve query reliability",
+    "📊 **Volume Analysis**: Monitor query volume and usage patterns"
+])
+
+# Enhanced sample requirements, with the "Custom" entry first
+SAMPLES = (
+    "Custom",
+    "Create a daily sales report by region and product category",
+    "Build customer segmentation with RFM analysis and lifetime value prediction", 
+    "Generate monthly inventory turnover report with ABC analysis",
+    "Create fraud detection pipeline with anomaly scoring",
+    "Build customer lifetime value analysis with cohort tracking",
+    "Show top 10 customers by total purchase amount with growth trends",
+    "Analyze sales trends by month with year-over-year comparison",
+    "Find products with declining sales and recommend actions",
+    "Create executive dashboard with KPIs and performance metrics",
+    "Build real-time sales monitoring with automated alerts"
+)
+
+FOOTER_BRANDING_MD = "### 🚀 Built by Dinesh Appala | Day 3 Enhanced | AI + Database + Advanced Analytics"
+
+# Component availability is fixed at import time, so the status line is too
+_active_features = [
+    name for available, name in ((OPTIMIZER_AVAILABLE, "🔍 SQL Optimizer"), (EXPORT_AVAILABLE, "📁 Multi-Export"))
+    if available
+]
+if _active_features:
+    FEATURE_STATUS_MD = f"**⚡ Active Day 3 Features:** {' • '.join(_active_features)}"
+else:
+    FEATURE_STATUS_MD = "**🔧 Day 3 Backend Components:** SQL Optimizer Engine ✅ • Export Manager ✅ • Ready for Integration"
+
 # Page config
 st.set_page_config(
     page_title="Smart SQL Agent - Enhanced",
@@ -38,86 +97,199 @@ st.set_page_config(
 )
 
 # Enhanced CSS with Day 3 styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 0.5rem 0;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .success-box {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        border: none;
-        color: white;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .error-box {
-        background: linear-gradient(135deg, #ff758c 0%, #ff7eb3 100%);
-        border: none;
-        color: white;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .day3-feature {
-        background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 0.5rem 0;
-        color: #333;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'agent' not in st.session_state:
+@st.cache_data
+def _css():
+    """Stylesheet text, read from disk once per process"""
+    with open(os.path.join(os.path.dirname(__file__), "assets", "style.css"), encoding="utf-8") as css_file:
+        return css_file.read()
+
+st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
+
+# Same rule DatabaseManager enforces: only statements starting with SELECT are executed
+_SELECT_RE = re.compile(r"\s*SELECT\b", re.IGNORECASE)
+
+# Rows sent to the browser for a result table unless the full table is asked for
+PREVIEW_ROWS = 500
+
+def _show_preview(data, show_full=False):
+    """Render a result table capped at PREVIEW_ROWS rows"""
+    if show_full or len(data) <= PREVIEW_ROWS:
+        st.dataframe(data, use_container_width=True)
+    else:
+        st.dataframe(data.head(PREVIEW_ROWS), use_container_width=True)
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(data):,} rows.")
+
+# Above this size SQL is shown as plain text; syntax highlighting large blobs stalls the browser
+HIGHLIGHT_LIMIT = 8192
+
+def _show_sql(sql, key):
+    """Show SQL highlighted, or in a read-only text area when it is too large to highlight"""
+    if len(sql) > HIGHLIGHT_LIMIT:
+        st.text_area("SQL", sql, height=400, disabled=True, key=key)
+    else:
+        st.code(sql, language="sql")
+
+# Minimum seconds between redraws of the streamed SQL; each redraw resends the whole text
+STREAM_REFRESH_SECONDS = 0.1
+
+def _stream_to(placeholder):
+    """on_token callback that redraws the streamed SQL in placeholder at most every STREAM_REFRESH_SECONDS"""
+    last_draw = 0.0
+    
+    def on_token(text):
+        nonlocal last_draw
+        now = time.monotonic()
+        if now - last_draw >= STREAM_REFRESH_SECONDS:
+            last_draw = now
+            placeholder.code(text, language="sql")
+    
+    return on_token
+
+def _read_bytes(path):
+    """File contents for deferred download buttons"""
+    with open(path, "rb") as source:
+        return source.read()
+
+@st.cache_data(ttl=300)
+def _cached_schema(_db, db_path):
+    """Schema info shared by the sidebar and the generate tab (db_path keys the cache)"""
+    return _db.get_schema_info()
+
+@st.cache_data(ttl=300)
+def _schema_text(_db, db_path):
+    """Schema prompt text (one line per table with row counts), built once per schema fetch"""
+    schema = _cached_schema(_db, db_path)
+    return "".join(
+        f"{table}({', '.join(info['columns'])}) -- {info['row_count']} rows\n"
+        for table, info in schema.items()
+    )
+
+@st.cache_data(ttl=600)
+def _cached_exec(_db, db_path, sql):
+    """Sample-query results, reused across clicks and sessions (db_path and sql key the cache)"""
+    return _db.execute_query(sql)
+
+@st.cache_resource
+def _cached_analysis(_optimizer, sql):
+    """Static analysis of a sample query; kept as a shared object since it holds parsed tokens"""
+    return _optimizer.analyze_query(sql).materialize()
+
+@st.cache_data
+def _gauge(success_rate):
+    """Success-rate gauge figure, rebuilt only when the rate changes"""
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = success_rate,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "Success Rate (%)"},
+        gauge = {
+            'axis': {'range': [None, 100]},
+            'bar': {'color': "darkgreen"},
+            'steps': [
+                {'range': [0, 50], 'color': "lightgray"},
+                {'range': [50, 80], 'color': "yellow"},
+                {'range': [80, 100], 'color': "lightgreen"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 90
+            }
+        }
+    ))
+    return fig
+
+@st.cache_data
+def _trend(records):
+    """Rows-returned trend figure keyed on a tuple of (timestamp, row_count) pairs"""
+    import plotly.express as px
+    
+    df_trend = pd.DataFrame(records, columns=['timestamp', 'row_count'])
+    return px.line(df_trend, x='timestamp', y='row_count', title="Rows Returned Over Time")
+
+@st.cache_resource
+def _load_agent():
+    """Build the shared agent once; a failed build is cached too, as (None, error message)"""
     try:
-        st.session_state.agent = SQLPipelineAgent()
-        st.session_state.agent_ready = True
+        return SQLPipelineAgent(), None
     except Exception as e:
-        st.session_state.agent = None
-        st.session_state.agent_error = str(e)
-        st.session_state.agent_ready = False
+        return None, str(e)
+
+def get_agent():
+    """Single SQLPipelineAgent (and OpenAI client) shared by every session"""
+    return _load_agent()[0]
+
+@st.cache_resource
+def get_db():
+    """Single DatabaseManager (and SQLite connection) shared by every session"""
+    return DatabaseManager()
+
+@st.cache_resource
+def get_history():
+    """Single on-disk query history; each session reads back only its own rows"""
+    return QueryHistory()
+
+# Session ids are uuid4 hex strings; anything else in the URL is replaced with a fresh one
+_SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
 
-if 'db_manager' not in st.session_state:
+@st.cache_data(ttl=5)
+def _recent_history(_history, db_path, session_id):
+    """A session's latest HISTORY_LIMIT executions for the analytics tab (db_path keys the cache)"""
+    return _history.recent(session_id, HISTORY_LIMIT)
+
+# Initialize session state (the shared resources above hold the actual objects)
+if 'agent_ready' not in st.session_state:
+    agent_error = _load_agent()[1]
+    st.session_state.agent_ready = agent_error is None
+    if agent_error is not None:
+        st.session_state.agent_error = agent_error
+
+if 'session_id' not in st.session_state:
+    # Tags this session's rows in the shared on-disk history. It is kept in the URL,
+    # so a reload or a server restart reads the same history back.
+    session_id = st.query_params.get("session", "")
+    if not _SESSION_ID_RE.fullmatch(session_id):
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    st.session_state.session_id = session_id
+
+if 'db_ready' not in st.session_state:
     try:
-        st.session_state.db_manager = DatabaseManager()
+        get_db()
         st.session_state.db_ready = True
     except Exception as e:
-        st.session_state.db_manager = None
         st.session_state.db_error = str(e)
         st.session_state.db_ready = False
 
 # Initialize Day 3 components if available
 if 'optimizer' not in st.session_state and OPTIMIZER_AVAILABLE:
-    st.session_state.optimizer = SQLOptimizer(st.session_state.db_manager)
+    st.session_state.optimizer = SQLOptimizer(get_db() if st.session_state.db_ready else None)
 
 if 'export_manager' not in st.session_state and EXPORT_AVAILABLE:
     st.session_state.export_manager = ExportManager()
 
-if 'pipelines' not in st.session_state:
-    st.session_state.pipelines = []
-
+# Session history is a bounded ring buffer so long sessions keep constant memory and rerun cost
+HISTORY_LIMIT = 200
+# Executions (with their result previews) kept in memory for the Query Results tab;
+# the full history lives in the on-disk store
+RECENT_RESULTS_LIMIT = 10
 if 'executed_queries' not in st.session_state:
-    st.session_state.executed_queries = []
+    st.session_state.executed_queries = deque(maxlen=RECENT_RESULTS_LIMIT)
 
 if 'optimization_reports' not in st.session_state:
-    st.session_state.optimization_reports = []
+    st.session_state.optimization_reports = deque(maxlen=HISTORY_LIMIT)
+
+# Running performance-score totals so the averages don't rescan the reports
+if 'opt_score_sum' not in st.session_state:
+    st.session_state.opt_score_sum = 0.0
+    st.session_state.opt_score_count = 0
+
+# Running totals for the footer; the capped histories above can't be counted with len()
+if 'n_pipelines' not in st.session_state:
+    st.session_state.n_pipelines = 0
+    st.session_state.n_executed = 0
 
 # Header with Day 3 enhancement
 st.markdown('<h1 class="main-header">🚀 Smart SQL Pipeline Generator - Enhanced (Day 3) - DA</h1>', unsafe_allow_html=True)
@@ -152,7 +324,11 @@ with st.sidebar:
     st.header("🗄️ Database Info")
     
     if st.session_state.db_ready:
-        schema = st.session_state.db_manager.get_schema_info()
+        if st.button("🔄 Refresh schema"):
+            _cached_schema.clear()
+            _schema_text.clear()
+        
+        schema = _cached_schema(get_db(), get_db().db_path)
         
         st.subheader("📊 Tables")
         for table_name, info in schema.items():
@@ -191,13 +367,7 @@ with st.sidebar:
         st.write("🔧 Export Manager: Backend Ready")
     
     # Show Day 3 progress
-    st.markdown("""
-    **Day 3 Progress:**
-    - 🔍 SQL Optimization Engine ✅
-    - 📁 Multi-Format Export ✅  
-    - 📊 Advanced Analytics ✅
-    - 🎨 Enhanced UI ✅
-    """)
+    st.markdown(DAY3_PROGRESS_MD)
 
 # Enhanced main content tabs
 if EXPORT_AVAILABLE:
@@ -205,27 +375,15 @@ if EXPORT_AVAILABLE:
 else:
     tab1, tab2, tab3, tab4 = st.tabs(["🎯 Generate SQL", "📊 Query Results", "📋 Sample Queries", "📈 Analytics"])
 
-with tab1:
+@st.fragment
+def _render_generate_tab(complexity, auto_execute, auto_optimize, show_execution_plan):
+    """Generate SQL tab: requirement input, generation and the current pipeline"""
     st.header("📝 Generate SQL Pipeline with Advanced Analysis")
     
-    # Enhanced sample requirements
-    samples = [
-        "Create a daily sales report by region and product category",
-        "Build customer segmentation with RFM analysis and lifetime value prediction", 
-        "Generate monthly inventory turnover report with ABC analysis",
-        "Create fraud detection pipeline with anomaly scoring",
-        "Build customer lifetime value analysis with cohort tracking",
-        "Show top 10 customers by total purchase amount with growth trends",
-        "Analyze sales trends by month with year-over-year comparison",
-        "Find products with declining sales and recommend actions",
-        "Create executive dashboard with KPIs and performance metrics",
-        "Build real-time sales monitoring with automated alerts"
-    ]
-    
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        selected = st.selectbox("Enhanced Sample Requirements:", ["Custom"] + samples)
+        selected = st.selectbox("Enhanced Sample Requirements:", SAMPLES)
         
         if selected != "Custom":
             requirement = st.text_area("Business Requirement:", value=selected, height=120)
@@ -238,10 +396,7 @@ with tab1:
         
         # Enhanced schema info
         if st.session_state.db_ready:
-            schema = st.session_state.db_manager.get_schema_info()
-            schema_text = ""
-            for table, info in schema.items():
-                schema_text += f"{table}({', '.join(info['columns'])}) -- {info['row_count']} rows\n"
+            schema_text = _schema_text(get_db(), get_db().db_path)
         else:
             schema_text = ""
         
@@ -257,13 +412,17 @@ with tab1:
             if requirement.strip():
                 with st.spinner("🧠 AI is crafting your advanced SQL pipeline..."):
                     progress = st.progress(0)
-                    for i in range(50):
-                        time.sleep(0.02)
-                        progress.progress(i + 1)
-                    
-                    result = st.session_state.agent.generate_pipeline(requirement, schema_info, complexity)
                     
-                    progress.progress(75)
+                    # Progress is driven by real milestones only
+                    progress.progress(10)
+                    # Streamed outside any st.cache_data function, which would record every
+                    # redraw for replay; the agent itself remembers recent generations
+                    stream_box = st.empty()
+                    result = get_agent().generate_pipeline(
+                        requirement, schema_info, complexity, on_token=_stream_to(stream_box)
+                    )
+                    stream_box.empty()
+                    progress.progress(60)
                     
                     pipeline_data = {
                         "requirement": requirement,
@@ -272,15 +431,33 @@ with tab1:
                         "complexity": complexity
                     }
                     
-                    st.session_state.pipelines.append(pipeline_data)
+                    # Only the current result's full CSV is ever downloaded, so drop the previous one
+                    previous_result = st.session_state.get('current', {}).get('execution_result') or {}
+                    if previous_result.get('csv_path'):
+                        try:
+                            os.remove(previous_result['csv_path'])
+                        except OSError:
+                            pass
+                    
+                    # Only the latest pipeline is kept; nothing reads older ones, so they are just counted
+                    st.session_state.n_pipelines += 1
                     st.session_state.current = pipeline_data
                     
                     # Auto-execute if enabled
                     execution_result = None
+                    static_analysis = None
                     if auto_execute and not result.get("error") and st.session_state.db_ready:
                         sql_to_execute = result.get("main_query", result.get("full_response", ""))
-                        if sql_to_execute and "SELECT" in sql_to_execute.upper():
-                            execution_result = st.session_state.db_manager.execute_query(sql_to_execute)
+                        if sql_to_execute and _SELECT_RE.match(sql_to_execute):
+                            # Run the query on this session's script thread while a helper thread computes
+                            # the optimizer's execution-independent metrics.
+                            # Stream the rows: keep a preview in memory, write the full result to disk
+                            with ThreadPoolExecutor(max_workers=1) as executor:
+                                static_future = None
+                                if auto_optimize and OPTIMIZER_AVAILABLE:
+                                    static_future = executor.submit(st.session_state.optimizer.analyze_query_static, sql_to_execute)
+                                execution_result = get_db().execute_query_streaming(sql_to_execute, PREVIEW_ROWS)
+                                static_analysis = static_future.result() if static_future else None
                             pipeline_data["execution_result"] = execution_result
                             
                             # Store executed query
@@ -291,11 +468,30 @@ with tab1:
                                 "result": execution_result
                             }
                             st.session_state.executed_queries.append(query_record)
+                            st.session_state.n_executed += 1
+                            
+                            # Persist for the analytics tab, which reads history back from disk
+                            history = get_history()
+                            history.record(
+                                st.session_state.session_id,
+                                query_record['timestamp'],
+                                requirement,
+                                sql_to_execute,
+                                execution_result['success'],
+                                execution_result.get('row_count', 0),
+                                execution_result.get('execution_time', 0)
+                            )
+                            _recent_history.clear(history, history.db_path, st.session_state.session_id)
+                    
+                    progress.progress(85)
                     
                     # Auto-optimize if enabled and available
                     if auto_optimize and OPTIMIZER_AVAILABLE and execution_result:
                         sql_to_analyze = result.get("main_query", result.get("full_response", ""))
-                        optimization_analysis = st.session_state.optimizer.analyze_query(sql_to_analyze, execution_result)
+                        if static_analysis is not None:
+                            optimization_analysis = static_analysis.with_execution_result(execution_result)
+                        else:
+                            optimization_analysis = st.session_state.optimizer.analyze_query(sql_to_analyze, execution_result)
                         pipeline_data["optimization_analysis"] = optimization_analysis
                         
                         # Store optimization report
@@ -304,6 +500,8 @@ with tab1:
                             'requirement': requirement,
                             'analysis': optimization_analysis
                         })
+                        st.session_state.opt_score_sum += optimization_analysis.performance_score
+                        st.session_state.opt_score_count += 1
                     
                     progress.progress(100)
                     progress.empty()
@@ -323,10 +521,13 @@ with tab1:
             if result.get("error"):
                 st.markdown(f'<div class="error-box">❌ {result["error"]}</div>', unsafe_allow_html=True)
             else:
+                # Stable per-pipeline widget keys: reruns keep the widgets, a new pipeline gets fresh ones
+                pipeline_id = pipeline['timestamp'].replace(':', '-').replace(' ', '_')
+                
                 # Show generated SQL
                 sql_content = result.get("main_query", result.get("full_response", ""))
                 st.subheader("📜 Generated SQL")
-                st.code(sql_content, language="sql")
+                _show_sql(sql_content, f"current_sql_{pipeline_id}")
                 
                 # Show execution results if available
                 if "execution_result" in pipeline:
@@ -354,6 +555,8 @@ with tab1:
                         # Show data
                         if exec_result["row_count"] > 0:
                             st.dataframe(exec_result["data"], use_container_width=True)
+                            if exec_result["row_count"] > len(exec_result["data"]):
+                                st.caption(f"Showing the first {len(exec_result['data']):,} of {exec_result['row_count']:,} rows. Download the CSV for the full result.")
                         else:
                             st.info("Query executed successfully but returned no data.")
                     
@@ -395,18 +598,20 @@ with tab1:
                     st.download_button(
                         "📄 Download SQL",
                         sql_content,
-                        file_name=f"pipeline_{int(time.time())}.sql",
-                        mime="text/sql"
+                        file_name=f"pipeline_{pipeline_id}.sql",
+                        mime="text/sql",
+                        key=f"dl_sql_{pipeline_id}"
                     )
                 
                 with col_b:
                     if "execution_result" in pipeline and pipeline["execution_result"]["success"]:
-                        csv_data = pipeline["execution_result"]["data"].to_csv(index=False)
+                        # The full CSV is read from disk only when the button is actually clicked
                         st.download_button(
                             "📊 Download CSV",
-                            csv_data,
-                            file_name=f"results_{int(time.time())}.csv",
-                            mime="text/csv"
+                            partial(_read_bytes, pipeline["execution_result"]["csv_path"]),
+                            file_name=f"results_{pipeline_id}.csv",
+                            mime="text/csv",
+                            key=f"dl_csv_{pipeline_id}"
                         )
                 
                 with col_c:
@@ -416,8 +621,9 @@ with tab1:
                             st.download_button(
                                 "📋 Download Report",
                                 report,
-                                file_name=f"optimization_report_{int(time.time())}.md",
-                                mime="text/markdown"
+                                file_name=f"optimization_report_{pipeline_id}.md",
+                                mime="text/markdown",
+                                key=f"dl_report_{pipeline_id}"
                             )
                         else:
                             st.info("Optimization report available when optimizer is loaded")
@@ -426,43 +632,47 @@ with tab1:
             st.info("👆 Generate a SQL pipeline to see enhanced results here")
             
             st.subheader("🌟 Enhanced Day 3 Features:")
-            st.markdown("""
-            - **🔍 Performance Analysis** with 0-100 scoring
-            - **⚡ Optimization Suggestions** with specific recommendations
-            - **📊 Advanced Export Options** (CSV, JSON, Excel, SQL, TXT)
-            - **🎨 Enhanced UI** with professional styling
-            - **📈 Comprehensive Analytics** with trend analysis
-            """)
+            st.markdown(WHAT_YOU_GET_MD)
+
+with tab1:
+    _render_generate_tab(complexity, auto_execute, auto_optimize, show_execution_plan)
 
 # Continue with other tabs (keeping your existing code structure)
-with tab2:
+@st.fragment
+def _render_results_tab():
+    """Query Results tab: the most recent executions"""
     st.header("📊 Query Execution Results")
     
     if st.session_state.executed_queries:
         # Show recent executions
         st.subheader("🕒 Recent Query Executions")
         
-        for i, query_record in enumerate(reversed(st.session_state.executed_queries[-10:])):
-            with st.expander(f"Query {len(st.session_state.executed_queries) - i}: {query_record['requirement'][:50]}..."):
+        for i, query_record in enumerate(reversed(st.session_state.executed_queries)):
+            with st.expander(f"Query {st.session_state.n_executed - i}: {query_record['requirement'][:50]}..."):
                 st.write(f"**Executed:** {query_record['timestamp']}")
                 st.write(f"**Requirement:** {query_record['requirement']}")
                 
-                st.code(query_record['sql'], language="sql")
+                _show_sql(query_record['sql'], f"history_sql_{st.session_state.n_executed - i}")
                 
                 if query_record['result']['success']:
                     st.success(f"✅ Success: {query_record['result']['row_count']} rows returned")
                     if query_record['result']['row_count'] > 0:
-                        st.dataframe(query_record['result']['data'])
+                        _show_preview(query_record['result']['data'])
                 else:
                     st.error(f"❌ Error: {query_record['result']['error']}")
     else:
         st.info("No query executions yet. Generate and execute some SQL pipelines first!")
 
-with tab3:
+with tab2:
+    _render_results_tab()
+
+@st.fragment
+def _render_samples_tab():
+    """Sample Queries tab: run or analyze the built-in sample queries"""
     st.header("📋 Sample Queries")
     
     if st.session_state.db_ready:
-        sample_queries = st.session_state.db_manager.get_sample_queries()
+        sample_queries = get_db().get_sample_queries()
         
         for query in sample_queries:
             with st.expander(f"📊 {query['name']}"):
@@ -471,20 +681,21 @@ with tab3:
                 col_a, col_b = st.columns(2)
                 
                 with col_a:
+                    show_full = st.checkbox("Show full result (may be slow)", key=f"full_{query['name']}")
                     if st.button(f"▶️ Execute {query['name']}", key=f"exec_{query['name']}"):
                         with st.spinner(f"Executing {query['name']}..."):
-                            result = st.session_state.db_manager.execute_query(query['query'])
+                            result = _cached_exec(get_db(), get_db().db_path, query['query'])
                             
                             if result['success']:
                                 st.success(f"✅ Success: {result['row_count']} rows")
                                 if result['row_count'] > 0:
-                                    st.dataframe(result['data'])
+                                    _show_preview(result['data'], show_full)
                             else:
                                 st.error(f"❌ Error: {result['error']}")
                 
                 with col_b:
                     if OPTIMIZER_AVAILABLE and st.button(f"🔍 Analyze {query['name']}", key=f"analyze_{query['name']}"):
-                        analysis = st.session_state.optimizer.analyze_query(query['query'])
+                        analysis = _cached_analysis(st.session_state.optimizer, query['query'])
                         
                         col_i, col_ii, col_iii = st.columns(3)
                         with col_i:
@@ -494,261 +705,230 @@ with tab3:
                         with col_iii:
                             st.metric("Readability", f"{analysis.readability_score}/100")
 
+with tab3:
+    _render_samples_tab()
+
 # Export Center tab (only if export manager is available)
-if EXPORT_AVAILABLE:
-    with tab4:
-        st.header("📁 Export Center")
+@st.fragment
+def _render_export_tab():
+    """Export Center tab: multi-format export of the current result"""
+    st.header("📁 Export Center")
         
-        st.markdown("""
-        <div class="day3-feature">
-            <h3>🚀 Professional Export Capabilities</h3>
-            <p>Export your query results in multiple professional formats with complete metadata</p>
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown("""
+    <div class="day3-feature">
+        <h3>🚀 Professional Export Capabilities</h3>
+        <p>Export your query results in multiple professional formats with complete metadata</p>
+    </div>
+    """, unsafe_allow_html=True)
         
-        if 'current' in st.session_state and st.session_state.current.get('execution_result', {}).get('success'):
-            current_data = st.session_state.current['execution_result']['data']
-            current_info = {
-                'requirement': st.session_state.current['requirement'],
-                'complexity': st.session_state.current['complexity'],
-                'execution_time': st.session_state.current['execution_result']['execution_time']
-            }
+    if 'current' in st.session_state and st.session_state.current.get('execution_result', {}).get('success'):
+        current_data = st.session_state.current['execution_result']['data']
+        current_info = {
+            'requirement': st.session_state.current['requirement'],
+            'complexity': st.session_state.current['complexity'],
+            'execution_time': st.session_state.current['execution_result']['execution_time']
+        }
             
-            st.subheader("📊 Current Query Results Export")
+        st.subheader("📊 Current Query Results Export")
             
-            # Export format selection
-            col1, col2, col3 = st.columns([2, 1, 1])
+        # Export format selection
+        col1, col2, col3 = st.columns([2, 1, 1])
             
-            with col1:
-                export_formats = st.multiselect(
-                    "Select export formats:",
-                    ["csv", "json", "excel", "sql", "txt"],
-                    default=["csv"]
-                )
+        with col1:
+            export_formats = st.multiselect(
+                "Select export formats:",
+                ["csv", "json", "excel", "sql", "txt"],
+                default=["csv"]
+            )
             
-            with col2:
-                export_filename = st.text_input("Filename:", value="query_results")
+        with col2:
+            export_filename = st.text_input("Filename:", value="query_results")
             
-            with col3:
-                if st.button("📤 Export Selected", type="primary"):
-                    if export_formats:
-                        exports = []
+        with col3:
+            if st.button("📤 Export Selected", type="primary"):
+                if export_formats:
+                    with st.spinner("Generating exports..."):
+                        # Exports need every row with the column types the query returned. The streamed
+                        # CSV would re-infer them ('007' -> 7.0, 'NA' -> NaN), so the query is run again
+                        current_result = st.session_state.current['result']
+                        full_result = get_db().execute_query(
+                            current_result.get("main_query", current_result.get("full_response", ""))
+                        )
                         
-                        with st.spinner("Generating exports..."):
-                            for format_type in export_formats:
-                                export_result = st.session_state.export_manager.export_query_results(
-                                    current_data,
-                                    format_type,
-                                    export_filename,
-                                    current_info
-                                )
-                                exports.append(export_result)
+                        if not full_result['success']:
+                            exports = [(format_type, full_result) for format_type in export_formats]
+                        else:
+                            # Serialize every format concurrently on this click's own pool, keeping the selection order for display
+                            with ThreadPoolExecutor(max_workers=len(export_formats)) as executor:
+                                export_futures = [
+                                    (format_type, executor.submit(
+                                        st.session_state.export_manager.export_query_results,
+                                        full_result['data'],
+                                        format_type,
+                                        export_filename,
+                                        current_info
+                                    ))
+                                    for format_type in export_formats
+                                ]
+                                exports = [(format_type, future.result()) for format_type, future in export_futures]
                         
-                        # Show export results
-                        st.subheader("📋 Export Results")
+                    # Show export results
+                    st.subheader("📋 Export Results")
                         
-                        for export in exports:
-                            if export['success']:
-                                col_a, col_b, col_c = st.columns([2, 1, 1])
+                    for format_type, export in exports:
+                        if export['success']:
+                            col_a, col_b, col_c = st.columns([2, 1, 1])
                                 
-                                with col_a:
-                                    st.success(f"✅ {export['filename']}")
+                            with col_a:
+                                st.success(f"✅ {export['filename']}")
                                 
-                                with col_b:
-                                    size_kb = export['size'] / 1024
-                                    st.write(f"{size_kb:.1f} KB")
+                            with col_b:
+                                size_kb = export['size'] / 1024
+                                st.write(f"{size_kb:.1f} KB")
                                 
-                                with col_c:
-                                    st.download_button(
-                                        "📥 Download",
-                                        export['content'],
-                                        file_name=export['filename'],
-                                        mime=export['mime_type'],
-                                        key=f"download_{export['filename']}"
-                                    )
-                            else:
-                                st.error(f"❌ Failed to export {format_type}: {export['error']}")
+                            with col_c:
+                                st.download_button(
+                                    "📥 Download",
+                                    export['content'],
+                                    file_name=export['filename'],
+                                    mime=export['mime_type'],
+                                    key=f"download_{export['filename']}"
+                                )
+                        else:
+                            st.error(f"❌ Failed to export {format_type}: {export['error']}")
                     
-                    else:
-                        st.warning("Please select at least one export format")
+                else:
+                    st.warning("Please select at least one export format")
             
-            # Show data preview
-            st.subheader("👁️ Data Preview")
-            st.dataframe(current_data.head(10), use_container_width=True)
+        # Show data preview
+        st.subheader("👁️ Data Preview")
+        st.dataframe(current_data.head(10), use_container_width=True)
         
-        else:
-            st.info("No query results available for export. Execute a query first!")
+    else:
+        st.info("No query results available for export. Execute a query first!")
             
-            # Show supported formats
-            st.subheader("📋 Supported Export Formats")
+        # Show supported formats
+        st.subheader("📋 Supported Export Formats")
             
-            format_info = {
-                "CSV": "Comma-separated values for spreadsheet applications",
-                "JSON": "JavaScript Object Notation for web applications and APIs",
-                "Excel": "Microsoft Excel format with multiple sheets and metadata",
-                "SQL": "SQL INSERT statements for database import", 
-                "TXT": "Formatted text report with statistics and summaries"
-            }
+        format_info = {
+            "CSV": "Comma-separated values for spreadsheet applications",
+            "JSON": "JavaScript Object Notation for web applications and APIs",
+            "Excel": "Microsoft Excel format with multiple sheets and metadata",
+            "SQL": "SQL INSERT statements for database import", 
+            "TXT": "Formatted text report with statistics and summaries"
+        }
             
-            for format_name, description in format_info.items():
-                st.write(f"**{format_name}**: {description}")
+        for format_name, description in format_info.items():
+            st.write(f"**{format_name}**: {description}")
+
+if EXPORT_AVAILABLE:
+    with tab4:
+        _render_export_tab()
 
 # Analytics tab (use existing tab4 if no export, otherwise tab5)
 analytics_tab = tab5 if EXPORT_AVAILABLE else tab4
 
-with analytics_tab:
+@st.fragment
+def _render_analytics_tab():
+    """Analytics tab: execution and optimization statistics"""
     st.header("📈 Advanced Analytics Dashboard")
     
-    if st.session_state.executed_queries:
-        # Create enhanced analytics
-        df_queries = pd.DataFrame([
-            {
-                'timestamp': q['timestamp'],
-                'requirement': q['requirement'][:50] + "..." if len(q['requirement']) > 50 else q['requirement'],
-                'success': q['result']['success'],
-                'row_count': q['result'].get('row_count', 0),
-                'execution_time': q['result'].get('execution_time', 0)
-            } for q in st.session_state.executed_queries
-        ])
-        
-        # Enhanced summary statistics
-        st.subheader("📊 Enhanced Performance Indicators")
-        col1, col2, col3, col4, col5 = st.columns(5)
+    # Query metrics come from this session's rows in the persistent history, so they survive reloads and restarts
+    df_queries = _recent_history(get_history(), get_history().db_path, st.session_state.session_id)
+    
+    if df_queries.empty:
+        st.markdown(_EMPTY_ANALYTICS_MD)
+        return
+    
+    # Plotly is only needed once there is something to chart
+    import plotly.express as px
+    
+    # Enhanced summary statistics
+    st.subheader("📊 Enhanced Performance Indicators")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    with col1:
+        st.metric("Total Queries", len(df_queries))
+    with col2:
+        success_rate = (df_queries['success'].sum() / len(df_queries)) * 100
+        st.metric("Success Rate", f"{success_rate:.1f}%")
+    with col3:
+        avg_time = df_queries['execution_time'].mean()
+        st.metric("Avg Time", f"{avg_time:.3f}s")
+    with col4:
+        total_rows = df_queries['row_count'].sum()
+        st.metric("Total Rows", f"{total_rows:,}")
+    with col5:
+        if st.session_state.optimization_reports:
+            avg_score = st.session_state.opt_score_sum / st.session_state.opt_score_count
+            st.metric("Avg Performance", f"{avg_score:.0f}/100")
+        else:
+            st.metric("Optimizations", st.session_state.opt_score_count)
+    
+    # Enhanced visualizations
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("📊 Query Success Rate")
         
-        with col1:
-            st.metric("Total Queries", len(df_queries))
-        with col2:
-            success_rate = (df_queries['success'].sum() / len(df_queries)) * 100
-            st.metric("Success Rate", f"{success_rate:.1f}%")
-        with col3:
-            avg_time = df_queries['execution_time'].mean()
-            st.metric("Avg Time", f"{avg_time:.3f}s")
-        with col4:
-            total_rows = df_queries['row_count'].sum()
-            st.metric("Total Rows", f"{total_rows:,}")
-        with col5:
-            if st.session_state.optimization_reports:
-                avg_score = sum(r['analysis'].performance_score for r in st.session_state.optimization_reports) / len(st.session_state.optimization_reports)
-                st.metric("Avg Performance", f"{avg_score:.0f}/100")
-            else:
-                st.metric("Optimizations", len(st.session_state.optimization_reports))
+        st.plotly_chart(_gauge(float(success_rate)), use_container_width=True)
+    
+    with col2:
+        st.subheader("📈 Query Performance Trends")
+        if len(df_queries) > 1:
+            trend_records = tuple(df_queries[['timestamp', 'row_count']].itertuples(index=False, name=None))
+            st.plotly_chart(_trend(trend_records), use_container_width=True)
+        else:
+            st.info("Execute more queries to see performance trends")
+    
+    # Optimization insights
+    if st.session_state.optimization_reports:
+        st.subheader("🔍 Optimization Insights")
         
-        # Enhanced visualizations
         col1, col2 = st.columns(2)
         
         with col1:
-            st.subheader("📊 Query Success Rate")
-            
-            fig = go.Figure(go.Indicator(
-                mode = "gauge+number",
-                value = success_rate,
-                domain = {'x': [0, 1], 'y': [0, 1]},
-                title = {'text': "Success Rate (%)"},
-                gauge = {
-                    'axis': {'range': [None, 100]},
-                    'bar': {'color': "darkgreen"},
-                    'steps': [
-                        {'range': [0, 50], 'color': "lightgray"},
-                        {'range': [50, 80], 'color': "yellow"},
-                        {'range': [80, 100], 'color': "lightgreen"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': 90
-                    }
-                }
-            ))
-            
+            # Performance score distribution
+            scores = [r['analysis'].performance_score for r in st.session_state.optimization_reports]
+            fig = px.histogram(x=scores, nbins=10, title="Performance Score Distribution")
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            st.subheader("📈 Query Performance Trends")
-            if len(df_queries) > 1:
-                fig = px.line(df_queries, x='timestamp', y='row_count', 
-                            title="Rows Returned Over Time")
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Execute more queries to see performance trends")
-        
-        # Optimization insights
-        if st.session_state.optimization_reports:
-            st.subheader("🔍 Optimization Insights")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Performance score distribution
-                scores = [r['analysis'].performance_score for r in st.session_state.optimization_reports]
-                fig = px.histogram(x=scores, nbins=10, title="Performance Score Distribution")
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                # Complexity distribution
-                complexities = [r['analysis'].complexity.value for r in st.session_state.optimization_reports]
-                complexity_counts = pd.Series(complexities).value_counts()
-                fig = px.pie(values=complexity_counts.values, names=complexity_counts.index, 
-                           title="Query Complexity Distribution")
-                st.plotly_chart(fig, use_container_width=True)
-    
-    else:
-        st.info("No analytics data available yet. Execute some queries to see comprehensive analytics!")
-        
-        # Show what analytics will be available
-        st.subheader("📊 Available Analytics Features")
-        
-        analytics_features = [
-            "📈 **Performance Trends**: Track query execution times and success rates",
-            "🎯 **Optimization Insights**: Monitor performance improvements over time", 
-            "🔍 **Complexity Analysis**: Analyze query complexity distribution",
-            "⚡ **Success Rate Monitoring**: Track and improve query reliability",
-            "📊 **Volume Analysis**: Monitor query volume and usage patterns"
-        ]
-        
-        for feature in analytics_features:
-            st.markdown(feature)
+            # Complexity distribution
+            complexities = [r['analysis'].complexity.value for r in st.session_state.optimization_reports]
+            complexity_counts = Counter(complexities)
+            fig = px.pie(values=list(complexity_counts.values()), names=list(complexity_counts.keys()), 
+                       title="Query Complexity Distribution")
+            st.plotly_chart(fig, use_container_width=True)
+
+with analytics_tab:
+    _render_analytics_tab()
 
 # Enhanced footer
 st.markdown("---")
 
-# Enhanced metrics display
-if st.session_state.pipelines:
-    col1, col2, col3, col4, col5 = st.columns(5)
-    
-    with col1:
-        st.metric("Pipelines Generated", len(st.session_state.pipelines))
-    
-    with col2:
-        executed_count = len(st.session_state.executed_queries)
-        st.metric("Queries Executed", executed_count)
-    
-    with col3:
-        optimization_count = len(st.session_state.optimization_reports)
-        st.metric("Optimizations", optimization_count)
-    
-    with col4:
-        if st.session_state.optimization_reports:
-            avg_score = sum(r['analysis'].performance_score for r in st.session_state.optimization_reports) / len(st.session_state.optimization_reports)
-            st.metric("Avg Performance", f"{avg_score:.0f}/100")
-        else:
-            st.metric("Avg Performance", "N/A")
+# Enhanced metrics display (one table instead of five metric widgets)
+if st.session_state.n_pipelines:
+    if st.session_state.opt_score_count:
+        avg_score = st.session_state.opt_score_sum / st.session_state.opt_score_count
+        avg_performance = f"{avg_score:.0f}/100"
+    else:
+        avg_performance = "N/A"
     
-    with col5:
-        if st.session_state.pipelines:
-            latest = st.session_state.pipelines[-1]['timestamp']
-            st.metric("Last Generated", latest.split()[1])
+    st.dataframe(
+        pd.DataFrame({
+            "Pipelines Generated": [st.session_state.n_pipelines],
+            "Queries Executed": [st.session_state.n_executed],
+            "Optimizations": [st.session_state.opt_score_count],
+            "Avg Performance": [avg_performance],
+            "Last Generated": [st.session_state.current['timestamp'].split()[1]]
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
 
 # Enhanced footer with Day 3 branding
-st.markdown("### 🚀 Built by Dinesh Appala | Day 3 Enhanced | AI + Database + Advanced Analytics")
+st.markdown(FOOTER_BRANDING_MD)
 
 # Day 3 feature status
-feature_status = []
-if OPTIMIZER_AVAILABLE:
-    feature_status.append("🔍 SQL Optimizer")
-if EXPORT_AVAILABLE:
-    feature_status.append("📁 Multi-Export")
-
-if feature_status:
-    st.markdown(f"**⚡ Active Day 3 Features:** {' • '.join(feature_status)}")
-else:
-    st.markdown("**🔧 Day 3 Backend Components:** SQL Optimizer Engine ✅ • Export Manager ✅ • Ready for Integration")
+st.markdown(FEATURE_STATUS_MD)
@@ -2,40 +2,83 @@
 Smart SQL Pipeline Agent
 Converts natural language requirements to production-ready SQL pipelines
 """
-import openai
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# One HTTP connection pool for every agent in the process, created on first use
+_HTTP_CLIENT = None
+
+def _shared_http_client():
+    """Keep-alive client reused by every OpenAI client so connections and TLS sessions survive"""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        import openai
+        # openai's own httpx subclass keeps the SDK's default timeout and connection limits
+        _HTTP_CLIENT = openai.DefaultHttpxClient()
+    return _HTTP_CLIENT
+
 class SQLPipelineAgent:
+    # Static prompt text around the requirement, schema and complexity, built once
+    _PROMPT_PARTS = (
+        "Create a complete SQL data pipeline for this requirement:\n\"",
+        "\"\n\nDatabase schema: ",
+        "\nComplexity: ",
+        "\n\n"
+        "Provide:\n"
+        "1. MAIN_QUERY: Primary SQL with CTEs and proper formatting\n"
+        "2. VALIDATION: Data quality checks\n"
+        "3. MONITORING: Performance metrics\n"
+        "4. OPTIMIZATION: Performance tips\n"
+        "\n"
+        "Make it production-ready with comments.\n"
+    )
+    
+    # Output budget per complexity level; generation time grows with tokens produced
+    _MAX_TOKENS = {"simple": 500, "medium": 1200, "complex": 2000}
+    
+    # Generations remembered per agent for repeated identical requests
+    _CACHE_SIZE = 8
+    
     def __init__(self):
         """Initialize the SQL Pipeline Agent with OpenAI client"""
+        # openai is imported here so merely importing this module stays cheap
+        import openai
+        
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found. Please check your .env file.")
         
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = openai.OpenAI(api_key=api_key, http_client=_shared_http_client())
         
-    def generate_pipeline(self, requirement, schema_info="", complexity="medium"):
-        """Generate SQL pipeline from natural language requirement"""
+        # Last few successful generations, keyed by their inputs; the agent is shared across sessions
+        self._cache = {}
+        self._cache_lock = threading.Lock()
         
-        prompt = f"""
-        Create a complete SQL data pipeline for this requirement:
-        "{requirement}"
+    def generate_pipeline(self, requirement, schema_info="", complexity="medium", on_token=None):
+        """Generate SQL pipeline from natural language requirement
         
-        Database schema: {schema_info if schema_info else "Standard e-commerce schema"}
-        Complexity: {complexity}
+        When on_token is given the response is streamed and on_token is called
+        with the text received so far after every chunk.
+        """
         
-        Provide:
-        1. MAIN_QUERY: Primary SQL with CTEs and proper formatting
-        2. VALIDATION: Data quality checks
-        3. MONITORING: Performance metrics
-        4. OPTIMIZATION: Performance tips
+        key = (requirement, schema_info, complexity)
+        with self._cache_lock:
+            result = self._cache.pop(key, None)
+            if result is not None:
+                # Reinserting the hit at the end keeps the dict in least-recently-used order
+                self._cache[key] = result
+                return dict(result)
         
-        Make it production-ready with comments.
-        """
+        prompt = "".join((
+            self._PROMPT_PARTS[0], requirement,
+            self._PROMPT_PARTS[1], schema_info or "Standard e-commerce schema",
+            self._PROMPT_PARTS[2], complexity,
+            self._PROMPT_PARTS[3]
+        ))
         
         try:
             response = self.client.chat.completions.create(
@@ -45,11 +88,19 @@ class SQLPipelineAgent:
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.2,
-                max_tokens=2000
+                max_tokens=self._MAX_TOKENS.get(complexity, 1200),
+                stream=on_token is not None
             )
             
-            content = response.choices[0].message.content
-            return {
+            if on_token is None:
+                content = response.choices[0].message.content
+            else:
+                content = ""
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content += chunk.choices[0].delta.content
+                        on_token(content)
+            result = {
                 "main_query": content,
                 "validation": "-- Data quality checks included in main query",
                 "monitoring": "-- Performance metrics to be added",
@@ -57,6 +108,13 @@ class SQLPipelineAgent:
                 "full_response": content
             }
             
+            # Errors are never cached, so a failed call is retried next time
+            with self._cache_lock:
+                self._cache[key] = result
+                if len(self._cache) > self._CACHE_SIZE:
+                    self._cache.pop(next(iter(self._cache)))
+            return dict(result)
+            
         except Exception as e:
             return {
                 "error": f"Failed to generate SQL: {str(e)}",
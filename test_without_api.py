@@ -52,12 +52,16 @@ def test_fallback_sql_generation():
             
             # Check SQL content
             sql = result["sql"]
-            for keyword in test_case["expected_keywords"]:
-                assert keyword in sql.upper(), f"SQL should contain {keyword}"
+            sql_u = sql.upper()
+            missing = [keyword for keyword in test_case["expected_keywords"] if keyword not in sql_u]
+            assert not missing, f"SQL should contain {missing}"
             
-            print(f"   ✅ Generated {len(sql.split())} words of SQL")
-            print(f"   ✅ Complexity: {result['complexity']}")
-            print(f"   ✅ Validation checks: {len(result['validation_checks'])}")
+            # Space count approximates the word count without building a list of words
+            print("\n".join((
+                f"   ✅ Generated ~{sql.count(' ') + 1} words of SQL",
+                f"   ✅ Complexity: {result['complexity']}",
+                f"   ✅ Validation checks: {len(result['validation_checks'])}"
+            )))
             
         print("\n✅ All fallback SQL generation tests passed!")
         return True